@@ -1,10 +1,16 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
 
 
 class BaseCloudProvider(ABC):
     """Абстрактный базовый класс для всех облачных провайдеров."""
 
+    # Максимальное число одновременных операций в bulk_* методах
+    max_workers = 8
+
     def __init__(self, access_token: str, cloud_folder: str):
         self.access_token = access_token
         self.cloud_folder = cloud_folder
@@ -27,4 +33,30 @@ class BaseCloudProvider(ABC):
     @abstractmethod
     def get_info(self) -> Optional[Dict]:
         """Получает информацию о файлах в облачном хранилище."""
-        pass
\ No newline at end of file
+        pass
+
+    def close(self) -> None:
+        """Освобождает ресурсы провайдера (сетевые соединения и т.п.)."""
+        pass
+
+    def _run_bulk(self, func: Callable[..., T], args_list: List[Tuple]) -> List[T]:
+        """Выполняет func для каждого набора аргументов, не более max_workers одновременно."""
+        if not args_list:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda args: func(*args), args_list))
+
+    def bulk_load(self, files: List[Tuple[str, str]]) -> Dict[str, bool]:
+        """Загружает несколько новых файлов. files - список пар (local_path, cloud_filename)."""
+        results = self._run_bulk(self.load, files)
+        return {cloud_filename: success for (_, cloud_filename), success in zip(files, results)}
+
+    def bulk_reload(self, files: List[Tuple[str, str]]) -> Dict[str, bool]:
+        """Перезаписывает несколько файлов. files - список пар (local_path, cloud_filename)."""
+        results = self._run_bulk(self.reload, files)
+        return {cloud_filename: success for (_, cloud_filename), success in zip(files, results)}
+
+    def bulk_delete(self, filenames: List[str]) -> Dict[str, bool]:
+        """Удаляет несколько файлов из облачного хранилища."""
+        results = self._run_bulk(self.delete, [(filename,) for filename in filenames])
+        return dict(zip(filenames, results))
@@ -1,3 +1,4 @@
+import errno
 import os
 import shutil
 from pathlib import Path
@@ -5,6 +6,30 @@ from typing import Dict, Optional
 from loguru import logger
 from .base import BaseCloudProvider
 
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _fast_copy(src: str, dst: str) -> None:
+    """
+    Копирует содержимое файла без метаданных.
+    На Linux использует copy_file_range, чтобы данные копировались в ядре без участия Python.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if hasattr(os, "copy_file_range"):
+            try:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            except OSError as e:
+                # Файловая система или ядро не поддерживают copy_file_range - докопируем обычным способом
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                    raise
+        # Копирует остаток (или весь файл, если copy_file_range недоступен)
+        shutil.copyfileobj(fsrc, fdst, length=COPY_CHUNK_SIZE)
+
 
 class LocalMockProvider(BaseCloudProvider):
     """
@@ -22,7 +47,7 @@ class LocalMockProvider(BaseCloudProvider):
         """Копирует файл в папку-заглушку."""
         try:
             destination = self.mock_cloud_path / cloud_filename
-            shutil.copy2(local_path, destination)
+            _fast_copy(local_path, destination)
             logger.info(f"MOCK: Copied {cloud_filename} to mock cloud")
             return True
         except Exception as e:
@@ -48,14 +73,13 @@ class LocalMockProvider(BaseCloudProvider):
     def get_info(self) -> Optional[Dict]:
         """Возвращает информацию о файлах в папке-заглушке."""
         try:
-            files = {}
-            for item in self.mock_cloud_path.iterdir():
-                if item.is_file():
-                    files[item.name] = {
-                        "path": str(item),
-                        "size": item.stat().st_size
-                    }
-            return {"_embedded": {"items": [{"name": k, "type": "file", **v} for k, v in files.items()]}}
+            with os.scandir(self.mock_cloud_path) as entries:
+                items = [
+                    {"name": entry.name, "type": "file", "path": entry.path, "size": entry.stat().st_size}
+                    for entry in entries
+                    if entry.is_file()
+                ]
+            return {"_embedded": {"items": items}}
         except Exception as e:
             logger.error(f"MOCK: Error reading mock cloud info: {e}")
             return None
\ No newline at end of file
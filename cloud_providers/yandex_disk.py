@@ -1,8 +1,18 @@
-import requests
-from typing import Dict, Optional
+import time
+import httpx
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
 from .base import BaseCloudProvider
 
+# Повтор запросов при сетевых сбоях и ответах 429/5xx: до 5 попыток
+# с экспоненциальной паузой (0.5, 1, 2, 4 с) или паузой из заголовка Retry-After.
+# Пауза из Retry-After ограничена: запросы выполняются под блокировкой синхронизации
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_ATTEMPTS = 5
+BACKOFF_FACTOR = 0.5
+MAX_RETRY_AFTER = 60
+REQUEST_TIMEOUT = 30.0
+
 
 class YandexDiskProvider(BaseCloudProvider):
     """Реализация для Yandex Disk API."""
@@ -10,88 +20,155 @@ class YandexDiskProvider(BaseCloudProvider):
     def __init__(self, access_token: str, cloud_folder: str):
         super().__init__(access_token, cloud_folder)
         self.base_url = "https://cloud-api.yandex.net/v1/disk/resources"
+        # Неизменные части запросов вычисляем один раз
+        self._upload_url = f"{self.base_url}/upload"
+        self._path_prefix = f"{self.cloud_folder}/"
+        self._info_params = {
+            "path": self.cloud_folder,
+            "limit": 1000,
+            "fields": "_embedded.items.name,_embedded.items.type,_embedded.items.md5,"
+                      "_embedded.items.size,_embedded.items.modified"
+        }
         self.headers = {
             "Authorization": f"OAuth {self.access_token}",
             "Accept": "application/json"
         }
-
-    def _check_response(self, response: requests.Response) -> bool:
+        # HTTP/2 мультиплексирует параллельные запросы в одном TCP/TLS-соединении
+        limits = httpx.Limits(max_connections=16, max_keepalive_connections=8)
+        self.client = httpx.Client(http2=True, headers=self.headers, timeout=REQUEST_TIMEOUT, limits=limits)
+        # Ссылки для загрузки ведут на другой хост: отдельный клиент, без токена
+        self.upload_client = httpx.Client(http2=True, timeout=REQUEST_TIMEOUT, limits=limits)
+        # Последний список файлов облачной папки и его ETag для условных запросов
+        self._last_info = None
+        self._last_info_etag = None
+
+    def close(self) -> None:
+        """Закрывает HTTP-клиенты."""
+        self.client.close()
+        self.upload_client.close()
+
+    def _send(self, client: httpx.Client, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Выполняет запрос, повторяя его при сетевых сбоях и ответах 429/5xx.
+        После исчерпания попыток ответ возвращается как есть и проверяется в _check_response.
+        """
+        content = kwargs.get("content")
+        for attempt in range(MAX_ATTEMPTS):
+            last_attempt = attempt == MAX_ATTEMPTS - 1
+            delay = BACKOFF_FACTOR * 2 ** attempt
+            if attempt and hasattr(content, "seek"):
+                content.seek(0)
+            try:
+                response = client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            time.sleep(min(int(retry_after), MAX_RETRY_AFTER) if retry_after.isdigit() else delay)
+
+    def _check_response(self, response: httpx.Response) -> bool:
         """Проверяет ответ API на ошибки."""
         if response.status_code not in (200, 201, 202, 204):
             logger.error(f"Yandex Disk API error: {response.status_code} - {response.text}")
             return False
         return True
 
-    def load(self, local_path: str, cloud_filename: str) -> bool:
-        upload_url = f"{self.base_url}/upload"
-        params = {
-            "path": f"{self.cloud_folder}/{cloud_filename}",
-            "overwrite": "false"
-        }
+    def _invalidate_info_cache(self) -> None:
+        """Сбрасывает сохраненный список файлов после изменений в облачной папке."""
+        self._last_info = None
+        self._last_info_etag = None
+
+    def _request_upload_href(self, cloud_filename: str, overwrite: bool) -> Optional[str]:
+        """Получает ссылку для загрузки файла."""
+        params = {"path": self._path_prefix + cloud_filename, "overwrite": "true" if overwrite else "false"}
 
+        self._invalidate_info_cache()
         try:
-            response = requests.get(upload_url, headers=self.headers, params=params)
+            response = self._send(self.client, "GET", self._upload_url, params=params)
             if not self._check_response(response):
-                return False
+                return None
+            return response.json().get("href")
+        except httpx.HTTPError as e:
+            logger.error(f"Network error while requesting upload link for {cloud_filename}: {e}")
+            return None
 
-            href = response.json().get("href")
+    def _put_file(self, local_path: str, cloud_filename: str, href: str) -> bool:
+        """Загружает содержимое файла по полученной ссылке."""
+        try:
             with open(local_path, "rb") as f:
-                response_upload = requests.put(href, files={"file": f})
+                response_upload = self._send(self.upload_client, "PUT", href, content=f)
             return self._check_response(response_upload)
-
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Network error during upload of {cloud_filename}: {e}")
             return False
         except OSError as e:
             logger.error(f"Error reading local file {local_path}: {e}")
             return False
 
-    def reload(self, local_path: str, cloud_filename: str) -> bool:
-        upload_url = f"{self.base_url}/upload"
-        params = {
-            "path": f"{self.cloud_folder}/{cloud_filename}",
-            "overwrite": "true"
-        }
+    def _upload(self, local_path: str, cloud_filename: str, overwrite: bool) -> bool:
+        """Получает ссылку для загрузки и загружает по ней файл."""
+        href = self._request_upload_href(cloud_filename, overwrite)
+        return href is not None and self._put_file(local_path, cloud_filename, href)
+
+    def _bulk_upload(self, files: List[Tuple[str, str]], overwrite: bool) -> Dict[str, bool]:
+        """
+        Загружает файлы порциями по max_workers: для каждой порции сначала параллельно
+        получает ссылки, затем параллельно загружает файлы.
+        Ссылки для загрузки живут недолго, поэтому заранее для всех файлов их не запрашиваем.
+        """
+        results = {cloud_filename: False for _, cloud_filename in files}
+        for start in range(0, len(files), self.max_workers):
+            batch = files[start:start + self.max_workers]
+            hrefs = self._run_bulk(self._request_upload_href, [(cloud_filename, overwrite) for _, cloud_filename in batch])
+            uploads = [(local_path, cloud_filename, href) for (local_path, cloud_filename), href in zip(batch, hrefs) if href]
+
+            uploaded = self._run_bulk(self._put_file, uploads)
+            results.update(zip((cloud_filename for _, cloud_filename, _ in uploads), uploaded))
+        return results
 
-        try:
-            response = requests.get(upload_url, headers=self.headers, params=params)
-            if not self._check_response(response):
-                return False
+    def load(self, local_path: str, cloud_filename: str) -> bool:
+        return self._upload(local_path, cloud_filename, overwrite=False)
 
-            href = response.json().get("href")
-            with open(local_path, "rb") as f:
-                response_upload = requests.put(href, files={"file": f})
-            return self._check_response(response_upload)
+    def reload(self, local_path: str, cloud_filename: str) -> bool:
+        return self._upload(local_path, cloud_filename, overwrite=True)
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Network error during reload of {cloud_filename}: {e}")
-            return False
-        except OSError as e:
-            logger.error(f"Error reading local file {local_path}: {e}")
-            return False
+    def bulk_load(self, files: List[Tuple[str, str]]) -> Dict[str, bool]:
+        return self._bulk_upload(files, overwrite=False)
+
+    def bulk_reload(self, files: List[Tuple[str, str]]) -> Dict[str, bool]:
+        return self._bulk_upload(files, overwrite=True)
 
     def delete(self, filename: str) -> bool:
-        delete_url = f"{self.base_url}"
-        params = {"path": f"{self.cloud_folder}/{filename}", "permanently": "true"}
+        params = {"path": self._path_prefix + filename, "permanently": "true"}
 
+        self._invalidate_info_cache()
         try:
-            response = requests.delete(delete_url, headers=self.headers, params=params)
+            response = self._send(self.client, "DELETE", self.base_url, params=params)
             if response.status_code == 404:
                 logger.info(f"File {filename} not found in cloud. Skipping delete.")
                 return True
             return self._check_response(response)
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Network error during deletion of {filename}: {e}")
             return False
 
     def get_info(self) -> Optional[Dict]:
-        params = {"path": self.cloud_folder, "limit": 1000}
+        headers = {"If-None-Match": self._last_info_etag} if self._last_info_etag else None
 
         try:
-            response = requests.get(self.base_url, headers=self.headers, params=params)
+            response = self._send(self.client, "GET", self.base_url, params=self._info_params, headers=headers)
+            if response.status_code == 304 and self._last_info is not None:
+                return self._last_info
             if not self._check_response(response):
                 return None
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            self._last_info = response.json()
+            self._last_info_etag = response.headers.get("ETag")
+            return self._last_info
+        except httpx.HTTPError as e:
             logger.error(f"Network error while fetching cloud info: {e}")
             return None
\ No newline at end of file
@@ -1,10 +1,28 @@
+import hashlib
+import json
 import os
+import tarfile
+import tempfile
+import threading
 import time
-from pathlib import Path
 from dotenv import load_dotenv
 from loguru import logger
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
 from cloud_providers import LocalMockProvider, YandexDiskProvider
 
+HASH_CHUNK_SIZE = 1024 * 1024
+# Пауза без событий по файлу, после которой он синхронизируется (секунды)
+DEBOUNCE_DELAY = 0.3
+# Имена архивов с мелкими файлами в облаке: bundle-<дата>-<время>.tar.gz
+BUNDLE_PREFIX = "bundle-"
+BUNDLE_SUFFIX = ".tar.gz"
+
+# Полная синхронизация и обработка событий не должны выполняться одновременно
+_sync_lock = threading.Lock()
+# Отпечатки (локальная папка, облако, настройки) после последнего цикла без ошибок, по локальной папке
+_last_fingerprints = {}
+
 
 def load_config():
     """Загружает конфигурацию из файла .env и выполняет валидацию."""
@@ -16,7 +34,11 @@ def load_config():
     config["access_token"] = os.getenv("ACCESS_TOKEN")
     config["sync_interval"] = int(os.getenv("SYNC_INTERVAL", 300))
     config["log_path"] = os.getenv("LOG_PATH", "sync_log.log")
+    config["state_path"] = os.getenv("STATE_PATH", ".sync_state.json")
     config["cloud_provider"] = os.getenv("CLOUD_PROVIDER", "yandex")
+    config["watch_changes"] = os.getenv("WATCH_CHANGES", "true").lower() in ("1", "true", "yes")
+    config["bundle_small_files"] = os.getenv("BUNDLE_SMALL_FILES", "false").lower() in ("1", "true", "yes")
+    config["bundle_threshold"] = int(os.getenv("BUNDLE_THRESHOLD", 102400))
 
     if not config["local_folder"]:
         raise ValueError("Parameter 'LOCAL_FOLDER_PATH' is not set in .env file.")
@@ -28,6 +50,10 @@ def load_config():
     if not os.path.isdir(config["local_folder"]):
         raise FileNotFoundError(f"Local folder '{config['local_folder']}' does not exist.")
 
+    # Служебные файлы сервиса не синхронизируются, даже если лежат в локальной папке
+    state_path = config["state_path"]
+    config["ignored_paths"] = {os.path.abspath(path) for path in (config["log_path"], state_path, f"{state_path}.tmp")}
+
     return config
 
 
@@ -37,7 +63,8 @@ def setup_logging(log_path: str):
     if log_dir and not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
-    logger.add(log_path, rotation="10 MB", level="INFO", enqueue=True)
+    # Sink потокобезопасен и без enqueue: очередь нужна только при записи из нескольких процессов
+    logger.add(log_path, rotation="10 MB", level="INFO", enqueue=False)
     logger.info("Logging setup complete.")
 
 
@@ -53,18 +80,88 @@ def get_cloud_provider(config: dict):
         raise ValueError(f"Unknown cloud provider: {provider_type}. Available: 'yandex', 'local_mock'")
 
 
-def get_local_state(local_folder_path: str):
-    """Сканирует локальную папку и возвращает состояние файлов."""
+def get_local_state(local_folder_path: str, ignored_paths: set = frozenset()):
+    """Сканирует локальную папку и возвращает состояние файлов, пропуская ignored_paths."""
     local_state = {}
+    local_folder = os.path.abspath(local_folder_path)
+    ignored_names = {os.path.basename(path) for path in ignored_paths if os.path.dirname(path) == local_folder}
     try:
-        for item in Path(local_folder_path).iterdir():
-            if item.is_file():
-                local_state[item.name] = item.stat().st_mtime
+        # DirEntry кэширует тип файла, поэтому is_file() не делает лишний stat()
+        with os.scandir(local_folder_path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name not in ignored_names:
+                    stat = entry.stat()
+                    local_state[entry.name] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
     except OSError as e:
         logger.error(f"Error reading local directory {local_folder_path}: {e}")
     return local_state
 
 
+def _load_state_cache(state_path: str) -> dict:
+    """Загружает сохраненное состояние синхронизированных файлов."""
+    if not os.path.exists(state_path):
+        return {}
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Error reading state cache {state_path}: {e}. Starting with empty state.")
+        return {}
+
+
+def _save_state_cache(state_path: str, state: dict):
+    """Сохраняет состояние синхронизированных файлов."""
+    tmp_path = f"{state_path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+    except OSError as e:
+        logger.error(f"Error writing state cache {state_path}: {e}")
+
+
+def _md5(path: str) -> str:
+    """Вычисляет MD5 файла."""
+    with open(path, "rb") as f:
+        # Python 3.11+: хэширование в C без копирования блоков через Python
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "md5").hexdigest()
+        digest = hashlib.md5()
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def _same_stat(cached: dict, local_info: dict) -> bool:
+    """Проверяет, что mtime и размер файла совпадают с сохраненными."""
+    return bool(cached) and cached.get("mtime_ns") == local_info["mtime_ns"] and cached.get("size") == local_info["size"]
+
+
+def _fingerprint(files: dict) -> int:
+    """Вычисляет отпечаток состояния папки по именам и атрибутам файлов."""
+    return hash(frozenset((name, tuple(sorted(info.items()))) for name, info in files.items()))
+
+
+def _is_bundle_name(filename: str) -> bool:
+    """Проверяет, является ли файл в облаке архивом с мелкими файлами."""
+    return filename.startswith(BUNDLE_PREFIX) and filename.endswith(BUNDLE_SUFFIX)
+
+
+def _upload_bundle(cloud_provider, local_folder: str, filenames: list, bundle_name: str) -> bool:
+    """Упаковывает файлы в архив tar.gz и загружает его в облако одним файлом."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bundle_path = os.path.join(tmp_dir, bundle_name)
+        try:
+            # dereference: для символических ссылок в архив попадает содержимое файла, а не сама ссылка
+            with tarfile.open(bundle_path, "w:gz", dereference=True) as tar:
+                for filename in filenames:
+                    tar.add(os.path.join(local_folder, filename), arcname=filename)
+        except OSError as e:
+            logger.error(f"Error creating bundle {bundle_name}: {e}")
+            return False
+        return cloud_provider.load(bundle_path, bundle_name)
+
+
 def get_cloud_state(cloud_provider):
     """Получает список файлов в облачной папке."""
     cloud_info = cloud_provider.get_info()
@@ -72,63 +169,344 @@ def get_cloud_state(cloud_provider):
     if cloud_info and "_embedded" in cloud_info and "items" in cloud_info["_embedded"]:
         for item in cloud_info["_embedded"]["items"]:
             if item["type"] == "file":
-                cloud_state[item["name"]] = True
+                cloud_state[item["name"]] = {"md5": item.get("md5"), "size": item.get("size")}
     return cloud_state
 
 
-def sync(local_folder: str, cloud_provider):
-    """Выполняет одну итерацию синхронизации."""
-    logger.info("Starting synchronization cycle.")
-
-    try:
-        local_files = get_local_state(local_folder)
-        cloud_files = get_cloud_state(cloud_provider)
-
-        # Удаляем из облака файлы, которых нет локально
-        for filename in list(cloud_files.keys()):
-            if filename not in local_files:
-                logger.info(f"File {filename} missing locally. Deleting from cloud.")
-                success = cloud_provider.delete(filename)
+def sync(local_folder: str, cloud_provider, state_path: str, bundle_threshold: int = None,
+         ignored_paths: set = frozenset()):
+    """
+    Выполняет одну итерацию синхронизации.
+    Если задан bundle_threshold, новые файлы меньше этого размера загружаются одним архивом.
+    Файлы из ignored_paths (лог, состояние сервиса) не синхронизируются.
+    """
+    with _sync_lock:
+        logger.info("Starting synchronization cycle.")
+        state = None
+        stats = {"uploaded": 0, "updated": 0, "deleted": 0, "bundled": 0, "failed": 0}
+
+        try:
+            local_files = get_local_state(local_folder, ignored_paths)
+            cloud_files = get_cloud_state(cloud_provider)
+
+            # Ни локальная папка, ни облако не менялись с последнего успешного цикла
+            fingerprint = (_fingerprint(local_files), _fingerprint(cloud_files), bundle_threshold)
+            if _last_fingerprints.get(local_folder) == fingerprint:
+                logger.info("Synchronization cycle finished: no changes.")
+                return
+
+            state = _load_state_cache(state_path)
+            # Записи состояния заменяются целиком, поэтому для сравнения достаточно поверхностной копии
+            initial_state = dict(state)
+
+            local_names = set(local_files)
+            # Архивы с мелкими файлами хранятся в облаке как резервные копии и не удаляются
+            cloud_names = {name for name in cloud_files if name in local_files or not _is_bundle_name(name)}
+
+            # Забываем файлы, которые удалены и локально, и в облаке
+            for filename in state.keys() - local_names - cloud_names:
+                del state[filename]
+
+            # Файлы, которых нет локально, удаляем из облака
+            to_delete = list(cloud_names - local_names)
+            to_load = []
+            to_reload = []
+            to_bundle = []
+
+            # Загружаем новые файлы
+            for filename in local_names - cloud_names:
+                local_info = local_files[filename]
+                cached = state.get(filename)
+                small = bundle_threshold is not None and local_info["size"] < bundle_threshold
+                # Мелкий файл уже сохранен в одном из архивов и не изменился
+                if small and cached and cached.get("bundle") and _same_stat(cached, local_info):
+                    continue
+
+                local_file_path = os.path.join(local_folder, filename)
+                try:
+                    new_state = {**local_info, "md5": _md5(local_file_path)}
+                except OSError as e:
+                    logger.error(f"Error reading local file {local_file_path}: {e}")
+                    stats["failed"] += 1
+                    continue
+
+                if small:
+                    if cached and cached.get("bundle") and cached.get("md5") == new_state["md5"]:
+                        state[filename] = {**new_state, "bundle": cached["bundle"]}
+                        continue
+                    logger.info("New small file {} found. Adding to bundle.", filename)
+                    to_bundle.append((filename, local_file_path, new_state))
+                else:
+                    logger.info("New file {} found. Uploading to cloud.", filename)
+                    to_load.append((filename, local_file_path, new_state))
+
+            # Проверяем изменения в файлах, которые есть и локально, и в облаке
+            for filename in local_names & cloud_names:
+                local_info = local_files[filename]
+                cloud_info = cloud_files[filename]
+                cached = state.get(filename)
+
+                local_file_path = os.path.join(local_folder, filename)
+
+                # Быстрая проверка: mtime и размер не изменились
+                if _same_stat(cached, local_info):
+                    # Провайдер не сообщает md5 или копия в облаке совпадает с последней загруженной
+                    if cloud_info["md5"] is None or (
+                        cloud_info["md5"] == cached.get("md5") and cloud_info["size"] == cached.get("size")
+                    ):
+                        continue
+                    logger.info("File {} changed in cloud. Restoring local version.", filename)
+                    to_reload.append((filename, local_file_path, cached))
+                    continue
+
+                try:
+                    md5 = _md5(local_file_path)
+                except OSError as e:
+                    logger.error(f"Error reading local file {local_file_path}: {e}")
+                    stats["failed"] += 1
+                    continue
+                new_state = {**local_info, "md5": md5}
+
+                # Файл "тронут", но содержимое совпадает с облачным
+                # (если провайдер не сообщает md5 - с последним загруженным)
+                if cloud_info["md5"] is not None:
+                    unchanged = cloud_info["md5"] == md5 and cloud_info["size"] == local_info["size"]
+                else:
+                    unchanged = bool(cached) and cached.get("md5") == md5
+                if unchanged:
+                    state[filename] = new_state
+                    continue
+                logger.info("File {} changed. Updating in cloud.", filename)
+                to_reload.append((filename, local_file_path, new_state))
+
+            results = cloud_provider.bulk_delete(to_delete)
+            for filename, success in results.items():
                 if success:
-                    logger.info(f"Successfully deleted {filename} from cloud.")
-
-        # Синхронизируем файлы, которые есть локально
-        for filename, local_mtime in local_files.items():
-            local_file_path = os.path.join(local_folder, filename)
-
-            if filename in cloud_files:
-                logger.info(f"File {filename} exists in cloud. Checking for changes...")
-                success = cloud_provider.reload(local_file_path, filename)
-                if success:
-                    logger.info(f"Successfully updated {filename} in cloud.")
+                    state.pop(filename, None)
+                    stats["deleted"] += 1
+                    logger.info("File {} missing locally. Deleted from cloud.", filename)
+                else:
+                    stats["failed"] += 1
+
+            results = cloud_provider.bulk_reload([(path, filename) for filename, path, _ in to_reload])
+            for filename, _, new_state in to_reload:
+                if results.get(filename):
+                    state[filename] = new_state
+                    stats["updated"] += 1
+                    logger.debug("Successfully updated {} in cloud.", filename)
+                else:
+                    stats["failed"] += 1
+
+            results = cloud_provider.bulk_load([(path, filename) for filename, path, _ in to_load])
+            for filename, _, new_state in to_load:
+                if results.get(filename):
+                    state[filename] = new_state
+                    stats["uploaded"] += 1
+                    logger.debug("Successfully uploaded {} to cloud.", filename)
+                else:
+                    stats["failed"] += 1
+
+            if to_bundle:
+                bundle_name = f"{BUNDLE_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}{BUNDLE_SUFFIX}"
+                filenames = [filename for filename, _, _ in to_bundle]
+                if _upload_bundle(cloud_provider, local_folder, filenames, bundle_name):
+                    for filename, _, new_state in to_bundle:
+                        state[filename] = {**new_state, "bundle": bundle_name}
+                    stats["bundled"] += len(to_bundle)
+                    logger.info(f"Successfully uploaded {len(to_bundle)} small files as {bundle_name}.")
+                else:
+                    stats["failed"] += len(to_bundle)
+
+            # Отпечаток снят до операций цикла. Запоминаем его, только если цикл ничего не изменил:
+            # иначе возврат облака к прежнему состоянию (например, удаление только что загруженного
+            # файла) был бы принят за отсутствие изменений. После неудачных операций следующий
+            # цикл тоже должен выполнить полное сравнение
+            no_changes = not (to_delete or to_load or to_reload or to_bundle) and state == initial_state
+            if no_changes and not stats["failed"]:
+                _last_fingerprints[local_folder] = fingerprint
             else:
-                logger.info(f"New file {filename} found. Uploading to cloud.")
-                success = cloud_provider.load(local_file_path, filename)
-                if success:
-                    logger.info(f"Successfully uploaded {filename} to cloud.")
-
-    except Exception as e:
-        logger.error(f"Error during synchronization: {e}")
-
-    logger.info("Synchronization cycle finished.")
+                _last_fingerprints.pop(local_folder, None)
+
+        except Exception as e:
+            logger.error(f"Error during synchronization: {e}")
+            _last_fingerprints.pop(local_folder, None)
+
+        if state is not None:
+            _save_state_cache(state_path, state)
+        logger.info(
+            "Synchronization cycle finished: {uploaded} uploaded, {updated} updated, "
+            "{deleted} deleted, {bundled} bundled, {failed} failed.",
+            **stats
+        )
+
+
+def sync_file(local_folder: str, cloud_provider, state_path: str, filename: str, bundle_threshold: int = None):
+    """
+    Синхронизирует один файл после события файловой системы.
+    Новые файлы меньше bundle_threshold оставляет полной синхронизации, которая упакует их в архив.
+    """
+    local_file_path = os.path.join(local_folder, filename)
+
+    with _sync_lock:
+        state = _load_state_cache(state_path)
+
+        try:
+            if os.path.isfile(local_file_path):
+                stat = os.stat(local_file_path)
+                local_info = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+                cached = state.get(filename)
+                if _same_stat(cached, local_info):
+                    return
+                # Мелкий файл, не загруженный в облако отдельно, попадет в архив при полной синхронизации
+                small = bundle_threshold is not None and local_info["size"] < bundle_threshold
+                if small and (not cached or cached.get("bundle")):
+                    return
+
+                new_state = {**local_info, "md5": _md5(local_file_path)}
+                if cached and cached.get("md5") == new_state["md5"]:
+                    state[filename] = {**cached, **new_state}
+                else:
+                    # reload() перезаписывает файл в облаке или создает новый
+                    logger.info("File {} changed locally. Uploading to cloud.", filename)
+                    if not cloud_provider.reload(local_file_path, filename):
+                        return
+                    logger.info("Successfully uploaded {} to cloud.", filename)
+                    state[filename] = new_state
+            else:
+                logger.info("File {} removed locally. Deleting from cloud.", filename)
+                if not cloud_provider.delete(filename):
+                    return
+                state.pop(filename, None)
+                logger.info("Successfully deleted {} from cloud.", filename)
+        except OSError as e:
+            logger.error(f"Error reading local file {local_file_path}: {e}")
+            return
+
+        _save_state_cache(state_path, state)
+
+
+class PendingChanges:
+    """Накапливает измененные файлы и выдает их после паузы в событиях."""
+
+    def __init__(self, delay: float = DEBOUNCE_DELAY):
+        self.delay = delay
+        self._pending = {}
+        self._condition = threading.Condition()
+
+    def add(self, filename: str):
+        """Откладывает обработку файла на delay секунд после последнего события."""
+        with self._condition:
+            self._pending[filename] = time.monotonic() + self.delay
+            self._condition.notify()
+
+    def pop_due(self) -> list:
+        """Ждет и возвращает файлы, по которым не было событий в течение delay секунд."""
+        with self._condition:
+            while True:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+
+                now = time.monotonic()
+                next_due = min(self._pending.values())
+                if next_due > now:
+                    self._condition.wait(next_due - now)
+                    continue
+
+                due = [filename for filename, deadline in self._pending.items() if deadline <= now]
+                for filename in due:
+                    del self._pending[filename]
+                return due
+
+
+class LocalChangeHandler(FileSystemEventHandler):
+    """Передает имена измененных файлов локальной папки в PendingChanges."""
+
+    def __init__(self, local_folder: str, changes: PendingChanges, ignored_paths: set):
+        super().__init__()
+        self.local_folder = os.path.abspath(local_folder)
+        self.changes = changes
+        self.ignored_paths = ignored_paths
+
+    def _add_change(self, path: str):
+        path = os.path.abspath(path)
+        # Вложенные папки не синхронизируются, служебные файлы сервиса пропускаем
+        if os.path.dirname(path) == self.local_folder and path not in self.ignored_paths:
+            self.changes.add(os.path.basename(path))
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._add_change(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._add_change(event.src_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self._add_change(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._add_change(event.src_path)
+            self._add_change(event.dest_path)
+
+
+def process_changes(local_folder: str, cloud_provider, state_path: str, changes: PendingChanges,
+                    bundle_threshold: int = None):
+    """Обрабатывает изменения, объединяя серию событий по одному файлу в одну синхронизацию."""
+    while True:
+        for filename in changes.pop_due():
+            try:
+                sync_file(local_folder, cloud_provider, state_path, filename, bundle_threshold)
+            except Exception as e:
+                logger.error(f"Error during synchronization of {filename}: {e}")
+
+
+def start_watching(config: dict, cloud_provider, bundle_threshold: int = None) -> Observer:
+    """Запускает отслеживание изменений в локальной папке."""
+    changes = PendingChanges()
+    state_path = config["state_path"]
+
+    observer = Observer()
+    handler = LocalChangeHandler(config["local_folder"], changes, config["ignored_paths"])
+    observer.schedule(handler, config["local_folder"], recursive=False)
+    observer.start()
+
+    worker = threading.Thread(
+        target=process_changes,
+        args=(config["local_folder"], cloud_provider, state_path, changes, bundle_threshold),
+        daemon=True
+    )
+    worker.start()
+    logger.info(f"Watching {config['local_folder']} for changes.")
+    return observer
 
 
 def main():
     """Главная функция приложения."""
+    cloud_provider = None
+    observer = None
     try:
         config = load_config()
         setup_logging(config["log_path"])
         logger.info(f"Service started. Syncing folder: {config['local_folder']}")
 
         cloud_provider = get_cloud_provider(config)
+        bundle_threshold = config["bundle_threshold"] if config["bundle_small_files"] else None
 
         # Первая синхронизация при запуске
-        sync(config["local_folder"], cloud_provider)
+        sync(config["local_folder"], cloud_provider, config["state_path"], bundle_threshold, config["ignored_paths"])
+
+        if config["watch_changes"]:
+            observer = start_watching(config, cloud_provider, bundle_threshold)
 
-        # Основной цикл работы
+        # Основной цикл работы: периодическая полная синхронизация
+        # (при отслеживании изменений подхватывает пропущенные события, а также файлы,
+        # удаленные, добавленные или измененные в облаке - по md5 из списка файлов)
         while True:
             time.sleep(config["sync_interval"])
-            sync(config["local_folder"], cloud_provider)
+            sync(config["local_folder"], cloud_provider, config["state_path"], bundle_threshold, config["ignored_paths"])
             logger.info(f"Next sync in {config['sync_interval']} seconds.")
 
     except (ValueError, FileNotFoundError) as e:
@@ -139,6 +517,12 @@ def main():
     except Exception as e:
         logger.critical(f"Unexpected error: {e}")
         print(f"A critical error occurred. See log file for details.")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        if cloud_provider is not None:
+            cloud_provider.close()
 
 
 if __name__ == "__main__":